@@ -9,7 +9,9 @@ import numpy as np
 import itertools
 import math
 import peakutils
+from functools import lru_cache
 from scipy.integrate import quad
+from scipy.special import erf
 from scipy.signal import find_peaks_cwt, ricker
 from scipy.stats import shapiro, linregress, anderson
 import warnings
@@ -37,15 +39,11 @@ def shannon_entropy(mag, magerr):
     
     mean = np.median(mag)
     RMS = root_mean_squared(mag)
-    
-    p_list1 = []
-    p_list2 = []
-    inv_list1 = []
-    inv_list2 = []
-    
-    t = range(0, len(mag))
-    d_delta = [i*2.0 for i in magerr]
-    
+
+    mag = np.asarray(mag)
+    magerr = np.asarray(magerr)
+    d_delta = magerr*2.0
+
     """Error fn definition: http://mathworld.wolfram.com/Erf.html"""
     def errfn(x):
         def integral(t):
@@ -53,30 +51,50 @@ def shannon_entropy(mag, magerr):
             return integrand
         integ, err = quad(integral, 0, x)
         return integ
-    
+
     """The Gaussian CDF: http://mathworld.wolfram.com/NormalDistribution.html"""
     def normal_gauss(x):
         return 0.5*(1. + errfn(x))
-    
+
     """Inverse Gaussian CDF: http://mathworld.wolfram.com/InverseGaussianDistribution.html"""
     def inv_gauss(x, y):
         return 0.5*(1. + errfn(x)) + (0.5*np.e**((2.*RMS)/mean))*(1. - errfn(y))
-    
-    for i in t:
-        val = normal_gauss((mag[i] + magerr[i] - mean)/(RMS*np.sqrt(2)))
-        p_list1.append(val if val >0 else 1)
-        
-        val2 = normal_gauss((mag[i] - magerr[i] - mean)/(RMS*np.sqrt(2)))
-        p_list2.append(val2 if val2 >0 else 1)
-        
-        val3 = inv_gauss(np.sqrt(RMS/(2.*(mag[i] + magerr[i])))*(((mag[i] + magerr[i])/mean) - 1.), np.sqrt(RMS/(2.*(mag[i] + magerr[i])))*(((mag[i] + magerr[i])/mean) + 1.))
-        inv_list1.append(val3 if val3 >0 else 1)
-        
-        val4 = inv_gauss(np.sqrt(RMS/(2.*(mag[i] - magerr[i])))*(((mag[i] - magerr[i])/mean) - 1.), np.sqrt(RMS/(2.*(mag[i] - magerr[i])))*(((mag[i] - magerr[i])/mean) + 1.))
-        inv_list2.append(val4 if val4 >0 else 1)
-    
-    entropy1 = -sum(np.log2(p_list1)*d_delta + np.log2(p_list2)*d_delta)
-    entropy2 = -sum(np.log2(inv_list1)*d_delta + np.log2(inv_list2)*d_delta)
+
+    """The CDFs are evaluated for the whole lightcurve at once with the closed form
+    erf, which agrees with the integral to ~1e-16 for |x| <= 5. Points outside that
+    range, where quad loses the peak, or where the ~1e-16 difference matters (small
+    probabilities, undefined arguments, or a large inverse Gaussian coefficient)
+    are recomputed with the integral so the entropy is unchanged."""
+    inv_coeff = 0.5*np.e**((2.*RMS)/mean)
+
+    def normal_cdf(x):
+        p = 0.5*(1. + erf(x))
+        redo = ~((p >= 1e-3) & (np.abs(x) <= 5))
+        p[redo] = [normal_gauss(i) for i in x[redo]]
+        return p
+
+    def inv_cdf(x, y):
+        p = 0.5*(1. + erf(x)) + inv_coeff*(1. - erf(y))
+        redo = ~((p >= 1e-3) & (np.abs(x) <= 5) & (np.abs(y) <= 5) & (inv_coeff < 1e3))
+        p[redo] = [inv_gauss(i, j) for i, j in zip(x[redo], y[redo])]
+        return p
+
+    upper = mag + magerr
+    lower = mag - magerr
+
+    p_list1 = normal_cdf((upper - mean)/(RMS*np.sqrt(2)))
+    p_list2 = normal_cdf((lower - mean)/(RMS*np.sqrt(2)))
+    inv_list1 = inv_cdf(np.sqrt(RMS/(2.*upper))*((upper/mean) - 1.), np.sqrt(RMS/(2.*upper))*((upper/mean) + 1.))
+    inv_list2 = inv_cdf(np.sqrt(RMS/(2.*lower))*((lower/mean) - 1.), np.sqrt(RMS/(2.*lower))*((lower/mean) + 1.))
+
+    # Non-positive (or undefined) probabilities are replaced by 1
+    p_list1 = np.where(p_list1 > 0, p_list1, 1)
+    p_list2 = np.where(p_list2 > 0, p_list2, 1)
+    inv_list1 = np.where(inv_list1 > 0, inv_list1, 1)
+    inv_list2 = np.where(inv_list2 > 0, inv_list2, 1)
+
+    entropy1 = -np.sum(np.log2(p_list1)*d_delta + np.log2(p_list2)*d_delta)
+    entropy2 = -np.sum(np.log2(inv_list1)*d_delta + np.log2(inv_list2)*d_delta)
 
     total_entropy = np.nan_to_num(entropy1 + entropy2)
     return total_entropy
@@ -1615,13 +1633,45 @@ def into_subchunks(mag, subchunk_length, every_n=1):
     with the settings subchunk_length = 3 and every_n = 2
     """
 
-    num_shifts = (len(mag) - subchunk_length) // every_n + 1
+    indexer = _subchunk_indexer(len(mag), subchunk_length, every_n)
+
+    return np.asarray(mag)[indexer]
+
+@lru_cache(maxsize=64)
+def _subchunk_indexer(length, subchunk_length, every_n):
+    """
+    Index array used by into_subchunks. It only depends on the length of the
+    lightcurve, so it is built once per cadence and reused for every lightcurve
+    sharing those timestamps. The cache is bounded, as lightcurves of arbitrary
+    lengths are classified outside of training.
+    """
+
+    num_shifts = (length - subchunk_length) // every_n + 1
     shift_starts = every_n * np.arange(num_shifts)
     indices = np.arange(subchunk_length)
 
     indexer = np.expand_dims(indices, axis=0) + np.expand_dims(shift_starts, axis=1)
+    indexer.setflags(write=False)
 
-    return np.asarray(mag)[indexer]
+    return indexer
+
+def _count_matches(templates, tolerance, block_size=2**20):
+    """
+    Number of ordered pairs of distinct templates (rows) whose Chebyshev distance
+    is within the tolerance. The pairwise distances are computed a block of rows
+    at a time to bound the memory used by long lightcurves.
+    """
+
+    n_rows = max(1, block_size // max(1, len(templates)))
+    counts = []
+    for start in range(0, len(templates), n_rows):
+        block = templates[start:start+n_rows]
+        dist = np.abs(block[:, np.newaxis, 0] - templates[np.newaxis, :, 0])
+        for k in range(1, templates.shape[1]):
+            np.maximum(dist, np.abs(block[:, np.newaxis, k] - templates[np.newaxis, :, k]), out=dist)
+        counts.append(np.count_nonzero(dist <= tolerance))
+
+    return np.sum(counts) - len(templates)
 
 def sample_entropy(mag):
     """
@@ -1640,10 +1690,10 @@ def sample_entropy(mag):
     tolerance = 0.2 * np.std(mag)  # 0.2 is a common value for r, according to wikipedia...
 
     xm = into_subchunks(mag, m)
-    B = np.sum([np.sum(np.abs(xmi - xm).max(axis=1) <= tolerance) - 1 for xmi in xm])
+    B = _count_matches(xm, tolerance)
 
     xmp1 = into_subchunks(mag, m + 1)
-    A = np.sum([np.sum(np.abs(xmi - xmp1).max(axis=1) <= tolerance) - 1 for xmi in xmp1])
+    A = _count_matches(xmp1, tolerance)
 
     SampEn = -np.log(A / B)
 
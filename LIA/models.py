@@ -4,11 +4,52 @@
     
     @author: danielgodinez
 """
+import os
 import numpy as np
 from warnings import warn
 from sklearn import decomposition
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.neural_network import MLPClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+def load_features(fname):
+    """Loads a features file output by training_set.create().
+
+    Binary .npz files are read directly as float64 arrays,
+    any other extension is parsed as the whitespace-delimited
+    text format.
+
+    Parameters
+    ----------
+    fname : str or path-like
+        Name of the features file, either the .npz or the .txt output.
+
+    Returns
+    -------
+    classes : array
+        Class label of each lightcurve.
+    ids : array
+        ID number of each lightcurve, left as strings when
+        read from a text file.
+    feats : array
+        2-D array of features, one row per lightcurve.
+    """
+    if os.fspath(fname).endswith('.npz'):
+        with np.load(fname) as data:
+            return data['classes'], data['ids'], data['feats']
+
+    data = np.loadtxt(fname, dtype=str, ndmin=2)
+    # Tables without an ID column would otherwise lose their first feature
+    try:
+        has_ids = bool(np.all(np.mod(data[:,1].astype(np.float64), 1) == 0))
+    except ValueError:
+        has_ids = False
+    if not has_ids:
+        raise ValueError("The second column of "+os.fspath(fname)+" is not an ID number, the features file must contain the class label and ID followed by the features.")
+
+    return data[:,0], data[:,1], data[:,2:].astype(np.float64)
 
 def create_models(all_feats, pca_feats=None, model='rf'):
     """Creates the Random Forest model and PCA transformation used for classification.
@@ -16,9 +57,9 @@ def create_models(all_feats, pca_feats=None, model='rf'):
     Parameters
     ----------
     all_feats : str
-        Name of text file containing all features and class label.
+        Name of file (.npz or .txt) containing all features and class label.
     pca_feats : optional, str
-        Name of text file containing PCA features and class label if
+        Name of file (.npz or .txt) containing PCA features and class label if
         you wish to apply PCA transformation. Default is None, which means
         the original features are used for classification. We recommend
         PCA transformation if using a Neural Network! 
@@ -26,6 +67,8 @@ def create_models(all_feats, pca_feats=None, model='rf'):
         Model to use for classification. 
         'rf': Random Forest 
         'nn': Neural Network
+        'sgd': Logistic regression trained by stochastic gradient
+        descent, much faster to train than 'nn' on large training sets
 
     Returns
     -------
@@ -34,27 +77,31 @@ def create_models(all_feats, pca_feats=None, model='rf'):
     pca_model : fn
         PCA transformation if pca_feats is not None.
     """
-    coeffs = np.loadtxt(all_feats,usecols=np.arange(2,84))
-    
+    classes, ids, coeffs = load_features(all_feats)
+
     if model == 'rf':
-        model = RandomForestClassifier(n_estimators=100)#, max_depth = 4, max_features=2, min_samples_leaf = 4, min_samples_split=2)
+        model = RandomForestClassifier(n_estimators=100, n_jobs=-1, random_state=0)#, max_depth = 4, max_features=2, min_samples_leaf = 4, min_samples_split=2)
     elif model == 'nn':
         model = MLPClassifier(hidden_layer_sizes=(1000,), max_iter=5000, activation='relu', solver='adam', tol=1e-4, learning_rate_init=.0001)
         if pca_feats is None:
             warn('Neural network classifier may works best with PCA transformation!')
+    elif model == 'sgd':
+        model = make_pipeline(StandardScaler(), SGDClassifier(loss='log_loss', n_jobs=-1, random_state=0))
     else:
-        raise ValueError("Model must be 'rf' or 'nn'")
+        raise ValueError("Model must be 'rf', 'nn' or 'sgd'")
 
     if pca_feats:
-        training_set = np.loadtxt(pca_feats, dtype = str)
-        pca = decomposition.PCA(n_components=82, whiten=True, svd_solver='auto')
+        pca_classes, pca_ids, pca_coeffs = load_features(pca_feats)
+        # Refit the same transformation that produced the PCA features
+        n_components = pca_coeffs.shape[1]
+        svd_solver = 'randomized' if n_components < coeffs.shape[1] else 'auto'
+        pca = decomposition.PCA(n_components=n_components, whiten=True, svd_solver=svd_solver, random_state=0)
         pca.fit(coeffs)
-        model.fit(training_set[:,np.arange(2,84)].astype(float),training_set[:,0])
+        model.fit(pca_coeffs,pca_classes)
 
         return model, pca
     else:
-        training_set = np.loadtxt(all_feats, dtype = str)
-        model.fit(training_set[:,np.arange(2,84)].astype(float),training_set[:,0])
+        model.fit(coeffs,classes)
 
         return model 
 
@@ -43,7 +43,7 @@ def create_noise(median, rms, degree=3):
 
     return fn
 
-def add_noise(mag, fn, zp=24, exptime=60):
+def add_noise(mag, fn, zp=24, exptime=60, rng=None):
     """Adds noise to magnitudes given a noise function. 
 
     Parameters
@@ -54,6 +54,9 @@ def add_noise(mag, fn, zp=24, exptime=60):
         Spline fit, must be defined using the create_noise function. 
     zp : Zeropoint
         Zeropoint of the instrument, default is 24.
+    rng : numpy.random.Generator, optional
+        Random number generator used to draw the noise.
+        Defaults to the global numpy random state.
         
     Returns
     -------
@@ -62,6 +65,8 @@ def add_noise(mag, fn, zp=24, exptime=60):
     magerr : array
         The corresponding magnitude errors.
     """  
+    if rng is None:
+        rng = np.random
 
     flux = 10**(-(mag-zp)/2.5)*exptime
 
@@ -70,12 +75,12 @@ def add_noise(mag, fn, zp=24, exptime=60):
 
     delta_fobs = flux*interp*(log(10)/2.5)
 
-    f_obs = np.random.normal(flux, delta_fobs)
+    f_obs = rng.normal(flux, delta_fobs)
 
     mag_obs = zp - 2.5*np.log10(f_obs/exptime)
     magerr = (2.5/log(10))*(delta_fobs/f_obs)
-        
-    return np.array(mag_obs), np.array(magerr)
+
+    return mag_obs, magerr
     
 def add_gaussian_noise_etienne(mag,zp=24):
     """Adds noise to lightcurve given the magnitudes.
@@ -106,7 +111,7 @@ def add_gaussian_noise_etienne(mag,zp=24):
 
     return mag,magerr
 
-def add_gaussian_noise(mag, zp=24, exptime=60):
+def add_gaussian_noise(mag, zp=24, exptime=60, rng=None):
     """Adds noise to lightcurve given the magnitudes.
 
     Parameters
@@ -116,6 +121,9 @@ def add_gaussian_noise(mag, zp=24, exptime=60):
     zp : zeropoint
         Zeropoint of the instrument, default is 24.
     convert : boolean, optional 
+    rng : numpy.random.Generator, optional
+        Random number generator used to draw the noise.
+        Defaults to the global numpy random state.
     
     Returns
     -------
@@ -124,13 +132,25 @@ def add_gaussian_noise(mag, zp=24, exptime=60):
     magerr : array
         The corresponding magnitude errors.
     """
-    flux = 10**((mag-zp)/-2.5)*exptime
-    
-    noisy_flux= np.random.poisson(flux)
-    magerr = 2.5/(log(10)*np.sqrt(noisy_flux))/noisy_flux
-    
-    noisy_mag = zp - 2.5*np.log10(noisy_flux/exptime)
-    magerr=np.array(magerr)
-    mag = np.array(mag)
+    if rng is None:
+        rng = np.random
+
+    # Same arithmetic as 10**((mag-zp)/-2.5)*exptime etc., done in place
+    # to avoid allocating a temporary array per operation
+    flux = np.subtract(mag, zp) / -2.5
+    np.power(10, flux, out=flux)
+    flux *= exptime
+
+    noisy_flux = rng.poisson(flux).astype(np.float64)
+
+    magerr = np.sqrt(noisy_flux)
+    magerr *= log(10)
+    np.divide(2.5, magerr, out=magerr)
+    magerr /= noisy_flux
+
+    noisy_mag = np.divide(noisy_flux, exptime)
+    np.log10(noisy_mag, out=noisy_mag)
+    noisy_mag *= 2.5
+    np.subtract(zp, noisy_mag, out=noisy_mag)
 
-    return np.array(noisy_mag), np.array(magerr)
+    return noisy_mag, magerr
@@ -7,6 +7,7 @@ Created on Thu Jun 28 20:30:11 2018
 from __future__ import division
 import numpy as np
 from LIA import simulate
+from LIA.models import load_features
 
 from sklearn.neural_network import MLPClassifier
 from sklearn.ensemble import RandomForestClassifier
@@ -47,18 +48,13 @@ def test_microlensing(timestamps, microlensing_mag, magerr, baseline, u_0, t_0,
     """
     mag = simulate.constant(timestamps, baseline)
     condition = False
-    signal_indices = np.argwhere((timestamps >= (t_0 - t_e)) & (timestamps <= (t_0 + t_e))) 
+    signal_indices = np.flatnonzero((timestamps >= (t_0 - t_e)) & (timestamps <= (t_0 + t_e)))
     if len(signal_indices) >= n:
         mean1 = np.mean(mag[signal_indices])
         mean2 = np.mean(microlensing_mag[signal_indices])
-                
-        signal_measurements = []
-        for inx in signal_indices:
-           value = (mag[inx] - microlensing_mag[inx]) / magerr[inx]
-           signal_measurements.append(value)
-
-        signal_measurements = np.array(signal_measurements)
-        if (len(np.argwhere(signal_measurements >= 3)) > 0 and 
+
+        signal_measurements = (mag[signal_indices] - microlensing_mag[signal_indices]) / magerr[signal_indices]
+        if (len(np.argwhere(signal_measurements >= 3)) > 0 and
            mean2 < (mean1 - 0.05) and 
            len(np.argwhere(signal_measurements > 3)) >= 0.33*len(signal_indices) and 
            (1.0/u_0) > blend_ratio):
@@ -95,27 +91,20 @@ def test_cv(timestamps, outburst_start_times, outburst_end_times, end_rise_times
     condition : boolean
         Returns True if CV passes the quality test. 
     """
-    signal_measurements = []
-    rise_measurements = []
-    fall_measurements = []
-    condition = False
-    for k in range(len(outburst_start_times)):
-        inx = len(np.argwhere((timestamps >= outburst_start_times[k])&(timestamps <= outburst_end_times[k])))
-        signal_measurements.append(inx)
-
-        inx = len(np.argwhere((timestamps >= outburst_start_times[k])&(timestamps <= end_rise_times[k])))
-        rise_measurements.append(inx)  
+    # Count the measurements within each outburst at once, one row per outburst
+    timestamps = np.asarray(timestamps)[np.newaxis, :]
+    start = np.asarray(outburst_start_times)[:, np.newaxis]
+    end = np.asarray(outburst_end_times)[:, np.newaxis]
+    end_rise = np.asarray(end_rise_times)[:, np.newaxis]
+    end_high = np.asarray(end_high_times)[:, np.newaxis]
 
-        inx = len(np.argwhere((timestamps >= end_high_times[k])&(timestamps <= outburst_end_times[k])))
-        fall_measurements.append(inx) 
+    signal_measurements = np.count_nonzero((timestamps >= start)&(timestamps <= end), axis=1)
+    rise_measurements = np.count_nonzero((timestamps >= start)&(timestamps <= end_rise), axis=1)
+    fall_measurements = np.count_nonzero((timestamps >= end_high)&(timestamps <= end), axis=1)
 
-    for k in range(len(signal_measurements)):
-        if signal_measurements[k] >= n1:
-            if rise_measurements[k] or fall_measurements[k] >= n2:
-                condition = True
-                break 
+    condition = bool(np.any((signal_measurements >= n1) & ((rise_measurements > 0) | (fall_measurements >= n2))))
 
-    return condition 
+    return condition
 
 def test_classifier(all_feats, pca_feats):
     """This function will test the Random Forest
@@ -129,10 +118,10 @@ def test_classifier(all_feats, pca_feats):
     Parameters
     ----------
     all_feats : str
-        Name of text file containing all features 
+        Name of file (.npz or .txt) containing all features
         This is output after running training_set.create()
     pca_feats : str
-        Name of text file containing PCA features 
+        Name of file (.npz or .txt) containing PCA features 
         This is output after running training_set.create()
 
     Returns
@@ -143,7 +132,7 @@ def test_classifier(all_feats, pca_feats):
     and without.
     """
     try:
-        train_data = np.loadtxt(all_feats, dtype=str)
+        y, ids, X = load_features(all_feats)
     except IOError:
         raise ValueError("Could not find features file, please check directory and try again.")
 
@@ -152,15 +141,15 @@ def test_classifier(all_feats, pca_feats):
     print("Testing classifier without PCA...")
     print("------------------------------")
 
-    X_train, X_test, y_train, y_test = train_test_split(train_data[:,np.arange(2,84)].astype(float),train_data[:,0])
+    X_train, X_test, y_train, y_test = train_test_split(X, y)
 
-    RF=RandomForestClassifier(n_estimators=100).fit(X_train, y_train)
+    RF=RandomForestClassifier(n_estimators=100, n_jobs=-1).fit(X_train, y_train)
     RF_pred_test = RF.predict(X_test)
-    RF_cross_validation = cross_validate(RF, train_data[:,np.arange(2,84)].astype(float), train_data[:,0], cv=10)
+    RF_cross_validation = cross_validate(RF, X, y, cv=10)
 
     NN = MLPClassifier(hidden_layer_sizes=(1000,), max_iter=5000, activation='relu', solver='adam', tol=1e-4, learning_rate_init=.0001).fit(X_train, y_train)
     NN_pred_test = NN.predict(X_test)
-    NN_cross_validation = cross_validate(NN, train_data[:,np.arange(2,84)].astype(float), train_data[:,0], cv=10)
+    NN_cross_validation = cross_validate(NN, X, y, cv=10)
 
     print(" --- Random Forest Classification Report ---")
     print(classification_report(y_test, RF_pred_test))
@@ -177,16 +166,16 @@ def test_classifier(all_feats, pca_feats):
     print("------------------------------")
     print("Testing classifier with PCA...")
     print("------------------------------")
-    train_data = np.loadtxt(pca_feats, dtype=str)
-    X_train, X_test, y_train, y_test = train_test_split(train_data[:,np.arange(2,84)].astype(float),train_data[:,0])
+    y, ids, X = load_features(pca_feats)
+    X_train, X_test, y_train, y_test = train_test_split(X, y)
 
-    RF=RandomForestClassifier(n_estimators=100).fit(X_train, y_train)
+    RF=RandomForestClassifier(n_estimators=100, n_jobs=-1).fit(X_train, y_train)
     RF_pred_test = RF.predict(X_test)
-    RF_cross_validation = cross_validate(RF, train_data[:,np.arange(2,84)].astype(float), train_data[:,0], cv=10)
+    RF_cross_validation = cross_validate(RF, X, y, cv=10)
 
     NN = MLPClassifier(hidden_layer_sizes=(1000,), max_iter=5000, activation='relu', solver='adam', tol=1e-4, learning_rate_init=.0001).fit(X_train, y_train)
     NN_pred_test = NN.predict(X_test)
-    NN_cross_validation = cross_validate(NN, train_data[:,np.arange(2,84)].astype(float), train_data[:,0], cv=10)
+    NN_cross_validation = cross_validate(NN, X, y, cv=10)
 
     print(" --- Random Forest Classification Report ---")
     print(classification_report(y_test, RF_pred_test))
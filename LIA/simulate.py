@@ -9,7 +9,7 @@ import numpy as np
 import os
 from math import pi
 
-def microlensing(timestamps, baseline, t0_dist = None, u0_dist = None, tE_dist = None):
+def microlensing(timestamps, baseline, t0_dist = None, u0_dist = None, tE_dist = None, rng = None):
     """Simulates a microlensing event.  
     The microlensing parameter space is determined using data from an 
     analysis of the OGLE III microlensing survey from Y. Tsapras et al (2016).
@@ -37,6 +37,9 @@ def microlensing(timestamps, baseline, t0_dist = None, u0_dist = None, tE_dist =
         considered during the microlensing simulations. The indivial
         tE per simulation will be selected from a uniform distribution
         between these two values.
+    rng : numpy.random.Generator, optional
+        Random number generator used to draw the parameters.
+        Defaults to the global numpy random state.
 
     Returns
     -------
@@ -51,6 +54,8 @@ def microlensing(timestamps, baseline, t0_dist = None, u0_dist = None, tE_dist =
     blend_ratio : float
         The blending coefficient chosen between 0 and 10.     
     """   
+    if rng is None:
+        rng = np.random
  
     mag = constant(timestamps, baseline)
     if t0_dist:
@@ -62,25 +67,25 @@ def microlensing(timestamps, baseline, t0_dist = None, u0_dist = None, tE_dist =
         lower_bound = np.percentile(timestamps, 10)
         upper_bound = np.percentile(timestamps, 90)
     
-    t_0 = np.random.uniform(lower_bound, upper_bound)  
+    t_0 = rng.uniform(lower_bound, upper_bound)  
 
     if u0_dist:
        lower_bound = u0_dist[0]
        upper_bound = u0_dist[1]
-       u_0 = np.random.uniform(lower_bound, upper_bound) 
+       u_0 = rng.uniform(lower_bound, upper_bound) 
     else:
              
-       u_0 = np.random.uniform(0, 1.0)
+       u_0 = rng.uniform(0, 1.0)
 
     if tE_dist:
        lower_bound = tE_dist[0]
        upper_bound = tE_dist[1]
-       t_e = np.random.normal(lower_bound, upper_bound) 
+       t_e = rng.normal(lower_bound, upper_bound) 
     else:
 
-        t_e = np.random.normal(30, 10.0)
+        t_e = rng.normal(30, 10.0)
     
-    blend_ratio = np.random.uniform(0,1)
+    blend_ratio = rng.uniform(0,1)
 
     u_t = np.sqrt(u_0**2 + ((timestamps - t_0) / t_e)**2)
     magnification = (u_t**2 + 2.) / (u_t * np.sqrt(u_t**2 + 4.))
@@ -97,7 +102,7 @@ def microlensing(timestamps, baseline, t0_dist = None, u0_dist = None, tE_dist =
 
     return np.array(microlensing_mag), baseline, u_0, t_0, t_e, blend_ratio
     
-def cv(timestamps, baseline):
+def cv(timestamps, baseline, rng=None):
     """Simulates Cataclysmic Variable event.
     The outburst can be reasonably well represented as three linear phases: a steeply 
     positive gradient in the rising phase, a flat phase at maximum brightness followed by a declining 
@@ -111,6 +116,9 @@ def cv(timestamps, baseline):
         Times at which to simulate the lightcurve.
     baseline : float
         Baseline magnitude at which to simulate the lightcurve.
+    rng : numpy.random.Generator, optional
+        Random number generator used to draw the parameters.
+        Defaults to the global numpy random state.
 
     Returns
     -------
@@ -125,9 +133,11 @@ def cv(timestamps, baseline):
     end_high_times : array
         The end time of each peak (end time of max amplitude).
     """
+    if rng is None:
+        rng = np.random
 
-    period = abs(np.random.normal(100, 200))
-    amplitude = np.random.uniform(0.5, 5.0)
+    period = abs(rng.normal(100, 200))
+    amplitude = rng.uniform(0.5, 5.0)
     lc = np.zeros(len(timestamps))
     # First generate the times when outbursts start. Note that the
     # duration of outbursts can vary for a single object, so the t_end_outbursts will be added later.
@@ -136,7 +146,7 @@ def cv(timestamps, baseline):
     min_start = min(timestamps)
     max_start = min((min(timestamps)+period),max(timestamps))
 
-    first_outburst_time = np.random.uniform(min_start, max_start)
+    first_outburst_time = rng.uniform(min_start, max_start)
 
     start_times.append(first_outburst_time)
     t_start = first_outburst_time + period
@@ -147,17 +157,20 @@ def cv(timestamps, baseline):
     outburst_end_times = []
     duration_times = []
     end_rise_times = []
-    end_high_times = []    
-    
+    end_high_times = []
+    timestamps = np.asarray(timestamps)
+
     for t_start_outburst in start_times:
     # Since each outburst can be a different shape,
     # generate the lightcurve morphology parameters for each outburst:
-        duration = np.random.uniform(3.0, (period/10.0))
+        # Same as uniform(3.0, period/10.0), written out as periods shorter than
+        # 30 days reverse the bounds, which Generator.uniform does not accept
+        duration = 3.0 + ((period/10.0) - 3.0)*rng.random()
         duration_times.append(duration)
         t_end_outburst = t_start_outburst + duration
         outburst_end_times.append(t_end_outburst)        
-        rise_time = np.random.uniform(0.5,1.0)
-        high_state_time = np.random.normal(0.4*duration, 0.2*duration)
+        rise_time = rng.uniform(0.5,1.0)
+        high_state_time = rng.normal(0.4*duration, 0.2*duration)
         drop_time = duration - rise_time - high_state_time
         t_end_rise = t_start_outburst + rise_time
         t_end_high = t_start_outburst + rise_time + high_state_time
@@ -168,13 +181,14 @@ def cv(timestamps, baseline):
 
         drop_gradient = (amplitude / drop_time)
 
-        for i in range(0,len(timestamps),1):
-                if timestamps[i] >= t_start_outburst and timestamps[i] <= t_end_rise:
-                        lc[i] = rise_gradient * (timestamps[i] -t_start_outburst)
-                elif timestamps[i] >= t_end_rise and timestamps[i] <= t_end_high:
-                        lc[i] = -1.0 * amplitude
-                elif timestamps[i] > t_end_high and timestamps[i] <= t_end_outburst:
-                        lc[i] = -amplitude + ( drop_gradient * (timestamps[i] - t_end_high))
+        # Masks are made mutually exclusive so the rise takes precedence over
+        # the high state, and the high state over the drop
+        rise = (timestamps >= t_start_outburst) & (timestamps <= t_end_rise)
+        high = (timestamps >= t_end_rise) & (timestamps <= t_end_high) & ~rise
+        drop = (timestamps > t_end_high) & (timestamps <= t_end_outburst) & ~rise & ~high
+        lc[rise] = rise_gradient * (timestamps[rise] - t_start_outburst)
+        lc[high] = -1.0 * amplitude
+        lc[drop] = -amplitude + (drop_gradient * (timestamps[drop] - t_end_high))
 
     lc = lc+baseline 
     return np.array(lc), np.array(start_times), np.array(outburst_end_times), np.array(end_rise_times), np.array(end_high_times)
@@ -195,11 +209,11 @@ def constant(timestamps, baseline):
     mag : array
         Simulated magnitudes given the timestamps.
     """
-    mag = [baseline] * len(timestamps)
+    mag = np.full(len(timestamps), baseline)
 
-    return np.array(mag)
+    return mag
 
-def variable(timestamps, baseline, bailey=None):       #theory, McGill et al. (2018)
+def variable(timestamps, baseline, bailey=None, rng=None):       #theory, McGill et al. (2018)
     """Simulates a variable star.  
 
     Parameters
@@ -214,6 +228,9 @@ def variable(timestamps, baseline, bailey=None):       #theory, McGill et al. (2
         of 2 simulates RR Lyrae type c, and a value of 
         3 simulates a Cepheid variable. If not provided
         it defaults to a random choice between the three. 
+    rng : numpy.random.Generator, optional
+        Random number generator used to draw the parameters.
+        Defaults to the global numpy random state.
 
     Returns
     -------
@@ -224,7 +241,7 @@ def variable(timestamps, baseline, bailey=None):       #theory, McGill et al. (2
     period : float
         Period of the signal in days.   
     """
-    time, ampl_k, phase_k, period = setup_parameters(timestamps, bailey)
+    time, ampl_k, phase_k, period = setup_parameters(timestamps, bailey, rng)
     lightcurve = np.array(baseline)
 
     for idx in range(len(ampl_k)):
@@ -233,7 +250,7 @@ def variable(timestamps, baseline, bailey=None):       #theory, McGill et al. (2
 
     return np.array(lightcurve), amplitude, period 
 
-def simulate_mira_lightcurve(timestamps, baseline, primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp):
+def simulate_mira_lightcurve(timestamps, baseline, primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp, rng=None):
     """Simulates LPV - Miras  
     Miras data from OGLE III: http://www.astrouw.edu.pl/ogle/ogle3/OIII-CVS/blg/lpv/pap.pdf
 
@@ -243,13 +260,16 @@ def simulate_mira_lightcurve(timestamps, baseline, primary_period, amplitude_pp,
         Times at which to simulate the lightcurve.
     baseline : float
         Baseline magnitude at which to simulate the lightcurve.
+    rng : numpy.random.Generator, optional
+        Random number generator used to draw the parameters.
+        Defaults to the global numpy random state.
 
     Returns
     -------
     mag : array
         Simulated magnitudes given the timestamps.
     """
-    amplitudes, periods = random_mira_parameters(primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp)
+    amplitudes, periods = random_mira_parameters(primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp, rng)
     lc = np.array(baseline)
 
     for idx in range(len(amplitudes)):
@@ -280,12 +300,14 @@ def parametersRR1():
     f3 =  1.9828297333333336
     return a1, ratio12, ratio13, ratio14, f1, f2, f3
 
-def uncertainties(time, curve, uncertain_factor):       
+def uncertainties(time, curve, uncertain_factor, rng=None):       
     """
     optional, add random uncertainties, controlled by the uncertain_factor
     """
+    if rng is None:
+        rng = np.random
     N = len(time)
-    uncertainty = np.random.normal(0, uncertain_factor/100, N)
+    uncertainty = rng.normal(0, uncertain_factor/100, N)
     realcurve = []   
                                        #curve with uncertainties
     for idx in range(N):
@@ -293,42 +315,55 @@ def uncertainties(time, curve, uncertain_factor):
 
     return realcurve
 
-def setup_parameters(timestamps, bailey=None):   
+def setup_parameters(timestamps, bailey=None, rng=None):   
     """
     Setup of random physical parameters
     """
+    if rng is None:
+        rng = np.random
     time = np.array(timestamps) 
     if bailey is None:
-        bailey = np.random.randint(1,4)
+        bailey = _randint(rng, 1, 4)
     if bailey < 0 or bailey > 3:
         raise RuntimeError("Bailey out of range, must be between 1 and 3.")
 
     a1, ratio12, ratio13, ratio14, f1, f2, f3  = parametersRR1()
 
     if bailey == 1:
-        period = np.random.normal(0.6, 0.15)
+        period = rng.normal(0.6, 0.15)
         a1, ratio12, ratio13, ratio14, f1, f2, f3  = parametersRR0()
     elif bailey == 2:
-        period = np.random.normal(0.33, 0.1)
+        period = rng.normal(0.33, 0.1)
     elif bailey == 3:
-        period = np.random.lognormal(0., 0.2)
+        period = rng.lognormal(0., 0.2)
         period = 10**period
 
     s = 20
     period=np.abs(period)  
-    n1 = np.random.normal(a1, 2*a1/s)
-    ampl_k = [n1, np.random.normal(n1*ratio12, n1*ratio12/s), np.random.normal(n1*ratio13, n1*ratio13/s), np.random.normal(n1*ratio14, n1*ratio14/s)]
-    phase_k = [0, np.random.normal(f1, f1/s), np.random.normal(f2, f2/s), np.random.normal(f3, f3/s)]
+    n1 = rng.normal(a1, 2*a1/s)
+    ampl_k = [n1, rng.normal(n1*ratio12, n1*ratio12/s), rng.normal(n1*ratio13, n1*ratio13/s), rng.normal(n1*ratio14, n1*ratio14/s)]
+    phase_k = [0, rng.normal(f1, f1/s), rng.normal(f2, f2/s), rng.normal(f3, f3/s)]
     
     return time, ampl_k, phase_k, period
 
-def random_mira_parameters(primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp):
+def random_mira_parameters(primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp, rng=None):
     """
     Setup of random physical parameters
     """
+    if rng is None:
+        rng = np.random
     len_miras = len(primary_period)
-    rand_idx = np.random.randint(0,len_miras,1)
+    rand_idx = _randint(rng, 0, len_miras, 1)
     amplitudes = [amplitude_pp[rand_idx], amplitude_sp[rand_idx], amplitude_tp[rand_idx]]
     periods = [primary_period[rand_idx], secondary_period[rand_idx], tertiary_period[rand_idx]]
 
     return amplitudes, periods
+
+def _randint(rng, low, high, size=None):
+    """
+    Draws integers in [low, high) from either a Generator or the
+    legacy numpy random state, which name this method differently
+    """
+    if isinstance(rng, np.random.Generator):
+        return rng.integers(low, high, size)
+    return rng.randint(low, high, size)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+    Unittest for loading the feature tables and creating the models.
+"""
+import os
+import pathlib
+import tempfile
+import numpy as np
+import unittest
+
+import sys
+sys.path.append('../')
+from LIA import models
+from LIA import training_set
+from LIA import microlensing_classifier
+
+classes = np.array(['CONSTANT', 'CV', 'LPV', 'ML', 'VARIABLE']*4)
+ids = np.arange(1, len(classes)+1)
+feats = np.random.RandomState(0).normal(size=(len(classes), 82))
+
+class Test(unittest.TestCase):
+    """
+    Unittest to ensure the feature tables written by training_set.create
+    load back identically from both the .npz and the .txt outputs, and
+    that the models created from them classify lightcurves.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_load_npz(self):
+        fname = os.path.join(self.path, 'all_features.npz')
+        np.savez(fname, classes=classes, ids=ids, feats=feats)
+        loaded_classes, loaded_ids, loaded_feats = models.load_features(fname)
+        self.assertTrue(np.array_equal(loaded_classes, classes))
+        self.assertTrue(np.array_equal(loaded_ids, ids))
+        self.assertTrue(np.array_equal(loaded_feats, feats))
+
+    def test_load_txt(self):
+        fname = os.path.join(self.path, 'all_features.txt')
+        np.savetxt(fname, np.c_[classes, ids, feats], fmt='%s')
+        loaded_classes, loaded_ids, loaded_feats = models.load_features(fname)
+        self.assertTrue(np.array_equal(loaded_classes, classes))
+        self.assertTrue(np.array_equal(loaded_ids.astype(int), ids))
+        self.assertTrue(np.array_equal(loaded_feats, feats))
+
+    def test_load_txt_without_ids(self):
+        fname = os.path.join(self.path, 'pca_features.txt')
+        np.savetxt(fname, np.c_[classes, feats], fmt='%s')
+        with self.assertRaises(ValueError):
+            models.load_features(fname)
+
+    def test_load_path(self):
+        for fname, save in [('all_features.npz', lambda f: np.savez(f, classes=classes, ids=ids, feats=feats)),
+                            ('all_features.txt', lambda f: np.savetxt(f, np.c_[classes, ids, feats], fmt='%s'))]:
+            path = pathlib.Path(self.path) / fname
+            save(path)
+            loaded_classes, loaded_ids, loaded_feats = models.load_features(path)
+            self.assertTrue(np.array_equal(loaded_classes, classes))
+            self.assertTrue(np.array_equal(loaded_feats, feats))
+
+    def test_sgd_model(self):
+        cwd = os.getcwd()
+        os.chdir(self.path)
+        try:
+            training_set.create([np.arange(0, 200, 1.)], n_class=17, test=False, n_jobs=1, seed=0)
+            model, pca = models.create_models('all_features.npz', 'pca_features.npz', model='sgd')
+        finally:
+            os.chdir(cwd)
+
+        data = np.loadtxt(os.path.join(os.path.dirname(__file__), 'ml_event.txt'))
+        time, mag, magerr = data[:,0], data[:,1], data[:,2]
+        prediction = microlensing_classifier.predict(time, mag, magerr, model, pca)
+        self.assertIn(prediction[0], ['CONSTANT', 'CV', 'LPV', 'ML', 'VARIABLE'])
+        self.assertAlmostEqual(float(sum(prediction[1:])), 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+    Unittest for the lightcurve simulations and noise models.
+"""
+import numpy as np
+import unittest
+
+import sys
+sys.path.append('../')
+from LIA import simulate
+from LIA import noise_models
+
+time = np.arange(0, 366, 1.)
+periods = np.array([300., 400., 500.])
+amplitudes = np.array([1., 2., 3.])
+
+def simulate_all(seed):
+    """Runs every simulation and noise model with a generator seeded by seed."""
+    rng = np.random.default_rng(seed)
+    variable = simulate.variable(time, 17, rng=rng)[0]
+    cv = simulate.cv(time, 17, rng=rng)[0]
+    microlensing = simulate.microlensing(time, 17, rng=rng)[0]
+    lpv = simulate.simulate_mira_lightcurve(time, 17, periods, amplitudes, periods, amplitudes, periods, amplitudes, rng=rng)
+    noise = noise_models.create_noise(np.linspace(14, 22, 20), np.linspace(0.01, 0.2, 20))
+    noisy = noise_models.add_noise(variable, noise, rng=rng)[0]
+    gaussian = noise_models.add_gaussian_noise(cv, zp=24, rng=rng)[0]
+
+    return [variable, cv, microlensing, lpv, noisy, gaussian]
+
+class Test(unittest.TestCase):
+    """
+    Unittest to ensure the simulations are reproducible when
+    given a seeded random number generator.
+    """
+    def test_rng_is_deterministic(self):
+        for first, second in zip(simulate_all(1), simulate_all(1)):
+            self.assertTrue(np.array_equal(first, second))
+
+    def test_rng_seeds_differ(self):
+        self.assertFalse(np.array_equal(simulate_all(1)[0], simulate_all(2)[0]))
+
+if __name__ == '__main__':
+    unittest.main()
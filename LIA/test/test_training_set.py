@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+    Unittest for creating the training set.
+"""
+import os
+import tempfile
+import numpy as np
+import unittest
+
+import sys
+sys.path.append('../')
+from LIA import training_set
+
+timestamps = [np.arange(0, 200, 1.), np.arange(0, 300, 3.)]
+
+def create_files(path, n_jobs, seed):
+    """Creates a small training set in path and returns the bytes of its outputs."""
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        training_set.create(timestamps, n_class=17, test=False, n_jobs=n_jobs, seed=seed)
+        outputs = {}
+        for fname in ['all_features.txt', 'pca_features.txt', 'lightcurves.fits']:
+            with open(fname, 'rb') as f:
+                outputs[fname] = f.read()
+    finally:
+        os.chdir(cwd)
+
+    return outputs
+
+class Test(unittest.TestCase):
+    """
+    Unittest to ensure the same seed reproduces the training set
+    regardless of the number of parallel jobs.
+    """
+    def test_seed_reproduces_training_set(self):
+        with tempfile.TemporaryDirectory() as path1, tempfile.TemporaryDirectory() as path2:
+            serial = create_files(path1, n_jobs=1, seed=42)
+            parallel = create_files(path2, n_jobs=2, seed=42)
+        for fname in serial:
+            self.assertEqual(serial[fname], parallel[fname], fname+" differs between n_jobs=1 and n_jobs=2.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,23 +4,23 @@ Created on Thu Jun 28 20:30:11 2018
 
 @author: danielgodinez
 """
-import os
-import random
 import pkg_resources
+from functools import lru_cache
 from warnings import warn
 
 import numpy as np
 from astropy.io import fits
-from progress import bar
+from tqdm import tqdm
 from astropy.io.votable import parse_single_table
 from sklearn import decomposition
+from joblib import Parallel, delayed
 
 from LIA import simulate
 from LIA import noise_models
 from LIA import quality_check
 from LIA import extract_features
     
-def create(timestamps, min_mag=14, max_mag=21, noise=None, n_class=500, ml_n1=7, cv_n1=7, cv_n2=1, t0_dist=None, u0_dist=None, tE_dist=None, test=True):
+def create(timestamps, min_mag=14, max_mag=21, noise=None, n_class=500, ml_n1=7, cv_n1=7, cv_n2=1, t0_dist=None, u0_dist=None, tE_dist=None, test=True, n_jobs=-1, pca_components=82, seed=None):
     """Creates a training dataset using adaptive cadence.
     Simulates each class n_class times, adding errors from
     a noise model either defined using the create_noise
@@ -70,19 +70,35 @@ def create(timestamps, min_mag=14, max_mag=21, noise=None, n_class=500, ml_n1=7,
     test: bool, optional
         If False there will be no classification reports after training.
         Defaults to True.
+    n_jobs: int, optional
+        The number of jobs to run in parallel when simulating the lightcurves
+        and computing their features, -1 means using all processors.
+        Defaults to -1.
+    pca_components: int, optional
+        The number of principal components to keep, between 1 and 82.
+        Keeping fewer than the 82 features fits the PCA with a randomized
+        SVD, which is faster for large training sets. Defaults to 82.
+    seed: int, optional
+        Seed for the simulations. The same seed reproduces the training
+        set for any value of n_jobs. If None, fresh entropy is drawn
+        from the operating system. Defaults to None.
 
     Outputs
     _______
     dataset : FITS
         All simulated lightcurves in a FITS file, sorted by class and ID
-    all_features : txt file
-        A txt file containing all the features plus class label and ID.
-    pca_stats : txt file
-        A txt file containing all PCA features plus class label and ID. 
+    all_features : txt and npz files
+        A txt file containing all the features plus class label and ID,
+        and the same table as a binary npz file for fast loading.
+    pca_stats : txt and npz files
+        A txt file containing all PCA features plus class label and ID,
+        and the same table as a binary npz file for fast loading.
     """
 
     if n_class < 17:
         raise ValueError("Parameter n_class must be at least 17 for principal components to be computed.")
+    if isinstance(pca_components, bool) or not isinstance(pca_components, (int, np.integer)) or not 1 <= pca_components <= 82:
+        raise ValueError("Parameter pca_components must be an integer between 1 and 82.")
     
     while True:
         try:
@@ -91,152 +107,86 @@ def create(timestamps, min_mag=14, max_mag=21, noise=None, n_class=500, ml_n1=7,
         except TypeError:
             raise ValueError("Incorrect format -- append the timestamps to a list and try again.")
 
-    times_list=[]
-    mag_list=[]
-    magerr_list=[]
-    id_list = []
-    source_class_list=[]
-    stats_list = []
-
-    progess_bar = bar.FillingSquaresBar('Simulating variables...', max=n_class)
-    for k in range(1,n_class+1):
-        time = random.choice(timestamps)
-        baseline = np.random.uniform(min_mag,max_mag)
-        mag, amplitude, period = simulate.variable(time,baseline)
-           
-        if noise is not None:
-            mag, magerr = noise_models.add_noise(mag, noise)
-        if noise is None:
-           mag, magerr = noise_models.add_gaussian_noise(mag,zp=max_mag+3)
-           
-        source_class = ['VARIABLE']*len(time)
-        source_class_list.append(source_class)
-
-        id_num = [k]*len(time)
-        id_list.append(id_num)
-
-        times_list.append(time)
-        mag_list.append(mag)
-        magerr_list.append(magerr)
-        
-        stats = extract_features.extract_all(time, mag,magerr,convert=True)
-        stats = [i for i in stats]
-        stats = ['VARIABLE'] + [k] + stats
-        stats_list.append(stats)
-        progess_bar.next()
-    progess_bar.finish()
-
-    progess_bar = bar.FillingSquaresBar('Simulating constants...', max=n_class)
-    for k in range(1,n_class+1):
-        time = random.choice(timestamps)
-        baseline = np.random.uniform(min_mag,max_mag)
-        mag = simulate.constant(time, baseline)
-        
-        if noise is not None:
-            mag, magerr = noise_models.add_noise(mag, noise)
-        if noise is None:
-           mag, magerr = noise_models.add_gaussian_noise(mag,zp=max_mag+3)
-           
-        source_class = ['CONSTANT']*len(time)
-        source_class_list.append(source_class)
-
-        id_num = [1*n_class+k]*len(time)
-        id_list.append(id_num)
-
-        times_list.append(time)
-        mag_list.append(mag)
-        magerr_list.append(magerr)
-        
-        stats = extract_features.extract_all(time, mag,magerr,convert=True)
-        stats = [i for i in stats]
-        stats = ['CONSTANT'] + [1*n_class+k] + stats
-        stats_list.append(stats) 
-        progess_bar.next()  
-    progess_bar.finish()
-
-    progess_bar = bar.FillingSquaresBar('Simulating CV...', max=n_class)   
-    for k in range(1,n_class+1):
-        for j in range(100):
-            if j > 20:
-                warn('Taking longer than usual to simulate CV... this happens if the timestamps are too sparse \
-                as it takes longer to simulate lightcurves that pass the quality check. The process will break after \
-                one hundred attempts, if this happens you can try setting the outburst parameter cv_n1 to a value between 2 and 6.')
-            time = random.choice(timestamps)
-            baseline = np.random.uniform(min_mag,max_mag)
-            mag, burst_start_times, burst_end_times, end_rise_times, end_high_times = simulate.cv(time, baseline)
-            
-            quality = quality_check.test_cv(time, burst_start_times, burst_end_times, end_rise_times, end_high_times, n1=cv_n1, n2=cv_n2)
-            if quality is True:
-                try:
-                    if noise is not None:
-                        mag, magerr = noise_models.add_noise(mag,noise)
-                    if noise is None:
-                        mag, magerr = noise_models.add_gaussian_noise(mag,zp=max_mag+3)
-                except ValueError:
-                    continue
-                
-                source_class = ['CV']*len(time)
-                source_class_list.append(source_class)
-                id_num = [2*n_class+k]*len(time)
-                id_list.append(id_num)
-            
-                times_list.append(time)
-                mag_list.append(mag)
-                magerr_list.append(magerr)
-                
-                stats = extract_features.extract_all(time,mag,magerr,convert=True)
-                stats = [i for i in stats]
-                stats = ['CV'] + [2*n_class+k] + stats
-                stats_list.append(stats)
-                progess_bar.next()
-                break
-
-            if j == 99:
-                raise RuntimeError('Unable to simulate proper CV in 100 tries with current cadence -- inspect cadence and try again.')
-    progess_bar.finish()
-
-    progess_bar = bar.FillingSquaresBar('Simulating microlensing...', max=n_class)  
-    for k in range(1,n_class+1):
-        for j in range(100):
-            if j > 20:
-                warn('Taking longer than usual to simulate ML... this happens if the timestamps are too sparse \
-                as it takes longer to simulate lightcurves that pass the quality check. The process will break after \
-                one hundred attempts, if this happens you can try setting the event parameter ml_n1 to a value between 2 and 6.')
-            time = random.choice(timestamps)
-            baseline = np.random.uniform(min_mag,max_mag)
-            mag, baseline, u_0, t_0, t_e, blend_ratio = simulate.microlensing(time, baseline, t0_dist, u0_dist, tE_dist)
+    primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp = _mira_arrays()
 
-            try:
-                if noise is not None:
-                    mag, magerr = noise_models.add_noise(mag,noise)
-                if noise is None:             
-                    mag, magerr= noise_models.add_gaussian_noise(mag,zp=max_mag+3)
-            except ValueError:
+    zp = max_mag+3
+    simulations = [('VARIABLE', 'Simulating variables', _simulate_variable, ()),
+        ('CONSTANT', 'Simulating constants', _simulate_constant, ()),
+        ('CV', 'Simulating CV', _simulate_cv, (timestamps, min_mag, max_mag, cv_n1, cv_n2)),
+        ('ML', 'Simulating microlensing', _simulate_microlensing, (timestamps, min_mag, max_mag, ml_n1, t0_dist, u0_dist, tE_dist)),
+        ('LPV', 'Simulating LPV', _simulate_lpv, (primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp))]
+
+    # Each lightcurve is simulated independently in its own job, with its own
+    # generator spawned from the seed. The cadences and baselines are drawn
+    # before any job runs, so the training set does not depend on n_jobs
+    seed_sequence = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_sequence)
+    choices = rng.integers(0, len(timestamps), (len(simulations), n_class))
+    baselines = rng.uniform(min_mag, max_mag, (len(simulations), n_class))
+    seeds = seed_sequence.spawn(len(simulations)*n_class)
+
+    # Preallocate the lightcurve table, filled through a write cursor and trimmed
+    # before writing. Rows are sized by the drawn cadences, except for CV and ML
+    # whose retries may switch to the longest one. The big-endian record layout
+    # matches the FITS binary table so it is written without a copy
+    lengths = np.array([len(t) for t in timestamps])
+    retries = np.array([source_class in ('CV', 'ML') for source_class, _, _, _ in simulations])
+    buffer_len = int(np.sum(np.where(retries[:, np.newaxis], lengths.max(), lengths[choices])))
+    lightcurves = np.empty(buffer_len, dtype=[('Class', 'S20'), ('ID', '>f4'), ('time', '>f8'), ('mag', '>f4'), ('magerr', '>f4')])
+    idx = 0
+
+    # Feature table, filled row by row and trimmed as LPVs may be skipped
+    classes = np.empty(len(simulations)*n_class, dtype='U8')
+    ids = np.empty(len(simulations)*n_class, dtype='i8')
+    features = np.empty((len(simulations)*n_class, 82))
+    row = 0
+    for n, (source_class, message, simulate_one, args) in enumerate(simulations):
+        class_ids = n*n_class + np.arange(1, n_class+1)
+        results = Parallel(n_jobs=n_jobs, return_as='generator')(delayed(simulate_one)(timestamps[choices[n,k]],
+            baselines[n,k], noise, zp, seeds[n*n_class+k], *args) for k in range(n_class))
+
+        # The bar only repaints every half second rather than on every lightcurve
+        for id_num, result in tqdm(zip(class_ids, results), desc=message, total=n_class, mininterval=0.5):
+            if result is None:
                 continue
-                
-            quality = quality_check.test_microlensing(time, mag, magerr, baseline, u_0, t_0, t_e, blend_ratio, n=ml_n1)
-            if quality is True:          
-                source_class = ['ML']*len(time)
-                source_class_list.append(source_class)
-                id_num = [3*n_class+k]*len(time)
-                id_list.append(id_num)
-            
-                times_list.append(time)
-                mag_list.append(mag)
-                magerr_list.append(magerr)
-               
-                stats = extract_features.extract_all(time, mag,magerr, convert=True)
-                stats = [i for i in stats]
-                stats = ['ML'] + [3*n_class+k] + stats
-                stats_list.append(stats)
-                progess_bar.next()
-                break
-
-            if j == 99:
-                raise RuntimeError('Unable to simulate proper ML in 100 tries with current cadence -- inspect cadence and/or noise model and try again.')
-    progess_bar.finish()
-    
-    progess_bar = bar.FillingSquaresBar('Simulating LPV...', max=n_class)  
+            time, mag, magerr, stats = result
+
+            L = len(time)
+            lightcurves['Class'][idx:idx+L] = source_class
+            lightcurves['ID'][idx:idx+L] = id_num
+            lightcurves['time'][idx:idx+L] = time
+            lightcurves['mag'][idx:idx+L] = mag
+            lightcurves['magerr'][idx:idx+L] = magerr
+            idx += L
+
+            classes[row], ids[row], features[row] = source_class, id_num, stats
+            row += 1
+    classes, ids, features = classes[:row], ids[:row], features[:row]
+
+    print('Writing files...')
+    hdu = fits.BinTableHDU(data=lightcurves[:idx])
+    hdu.writeto('lightcurves.fits',overwrite=True)
+
+    np.savetxt('all_features.txt', np.c_[classes, ids, features], fmt='%s')
+    np.savez('all_features.npz', classes=classes, ids=ids, feats=features)
+
+    svd_solver = 'randomized' if pca_components < features.shape[1] else 'auto'
+    pca = decomposition.PCA(n_components=pca_components, whiten=True, svd_solver=svd_solver, random_state=0)
+    X_pca = pca.fit_transform(features)
+
+    pca_ids = np.arange(1,len(classes)+1)
+    np.savetxt('pca_features.txt',np.c_[classes,pca_ids,X_pca],fmt='%s')
+    np.savez('pca_features.npz', classes=classes, ids=pca_ids, feats=X_pca)
+
+    if test == True:
+        quality_check.test_classifier('all_features.npz', 'pca_features.npz')
+
+@lru_cache(maxsize=1)
+def _mira_arrays():
+    """Loads the OGLE III Mira periods and amplitudes used to simulate LPVs.
+    The VO table is only parsed on the first call, later calls return the
+    same arrays.
+    """
     resource_package = __name__
     resource_path = '/'.join(('data', 'Miras_vo.xml'))
     template = pkg_resources.resource_filename(resource_package, resource_path)
@@ -248,64 +198,106 @@ def create(timestamps, min_mag=14, max_mag=21, noise=None, n_class=500, ml_n1=7,
     tertiary_period = mira_table.array['col8'].data
     amplitude_tp = mira_table.array['col9'].data
 
-    for k in range(1,n_class+1):
-        time = random.choice(timestamps)
-        baseline = np.random.uniform(min_mag,max_mag)
-        mag = simulate.simulate_mira_lightcurve(time, baseline, primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp)
-    
+    return primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp
+
+def _add_noise(mag, noise, zp, rng):
+    """Adds noise from the given noise model, or Gaussian noise if None.
+    """
+    if noise is not None:
+        return noise_models.add_noise(mag, noise, rng=rng)
+
+    return noise_models.add_gaussian_noise(mag, zp=zp, rng=rng)
+
+def _with_features(time, mag, magerr):
+    """Computes the features of a simulated lightcurve at full precision, and
+    returns the magnitudes as float32, the precision they are stored with.
+    """
+    stats = extract_features.extract_all(time, mag, magerr, convert=True)
+
+    return time, mag.astype(np.float32), magerr.astype(np.float32), stats
+
+def _simulate_variable(time, baseline, noise, zp, seed):
+    """Simulates a single variable and computes its features.
+    """
+    rng = np.random.default_rng(seed)
+    mag, amplitude, period = simulate.variable(time, baseline, rng=rng)
+    mag, magerr = _add_noise(mag, noise, zp, rng)
+
+    return _with_features(time, mag, magerr)
+
+def _simulate_constant(time, baseline, noise, zp, seed):
+    """Simulates a single constant and computes its features.
+    """
+    rng = np.random.default_rng(seed)
+    mag = simulate.constant(time, baseline)
+    mag, magerr = _add_noise(mag, noise, zp, rng)
+
+    return _with_features(time, mag, magerr)
+
+def _simulate_cv(time, baseline, noise, zp, seed, timestamps, min_mag, max_mag, n1, n2):
+    """Simulates a single CV that passes the quality check and computes its features.
+    If the first attempt fails, new timestamps and baselines are drawn for up to
+    one hundred attempts.
+    """
+    rng = np.random.default_rng(seed)
+    for j in range(100):
+        if j > 20:
+            warn('Taking longer than usual to simulate CV... this happens if the timestamps are too sparse \
+            as it takes longer to simulate lightcurves that pass the quality check. The process will break after \
+            one hundred attempts, if this happens you can try setting the outburst parameter cv_n1 to a value between 2 and 6.')
+        if j > 0:
+            time = timestamps[rng.integers(len(timestamps))]
+            baseline = rng.uniform(min_mag, max_mag)
+        mag, burst_start_times, burst_end_times, end_rise_times, end_high_times = simulate.cv(time, baseline, rng=rng)
+
+        quality = quality_check.test_cv(time, burst_start_times, burst_end_times, end_rise_times, end_high_times, n1=n1, n2=n2)
+        if quality is True:
+            try:
+                mag, magerr = _add_noise(mag, noise, zp, rng)
+            except ValueError:
+                continue
+
+            return _with_features(time, mag, magerr)
+
+    raise RuntimeError('Unable to simulate proper CV in 100 tries with current cadence -- inspect cadence and try again.')
+
+def _simulate_microlensing(time, baseline, noise, zp, seed, timestamps, min_mag, max_mag, n, t0_dist, u0_dist, tE_dist):
+    """Simulates a single microlensing event that passes the quality check and
+    computes its features. If the first attempt fails, new timestamps and baselines
+    are drawn for up to one hundred attempts.
+    """
+    rng = np.random.default_rng(seed)
+    for j in range(100):
+        if j > 20:
+            warn('Taking longer than usual to simulate ML... this happens if the timestamps are too sparse \
+            as it takes longer to simulate lightcurves that pass the quality check. The process will break after \
+            one hundred attempts, if this happens you can try setting the event parameter ml_n1 to a value between 2 and 6.')
+        if j > 0:
+            time = timestamps[rng.integers(len(timestamps))]
+            baseline = rng.uniform(min_mag, max_mag)
+        mag, baseline, u_0, t_0, t_e, blend_ratio = simulate.microlensing(time, baseline, t0_dist, u0_dist, tE_dist, rng=rng)
+
         try:
-            if noise is not None:
-                mag, magerr = noise_models.add_noise(mag,noise)
-            if noise is None:             
-                mag, magerr= noise_models.add_gaussian_noise(mag,zp=max_mag+3)
+            mag, magerr = _add_noise(mag, noise, zp, rng)
         except ValueError:
             continue
-                
-        source_class = ['LPV']*len(time)
-        source_class_list.append(source_class)
-
-        id_num = [4*n_class+k]*len(time)
-        id_list.append(id_num)
-
-        times_list.append(time)
-        mag_list.append(mag)
-        magerr_list.append(magerr)
-        
-        stats = extract_features.extract_all(time,mag,magerr,convert=True)
-        stats = [i for i in stats]
-        stats = ['LPV'] + [4*n_class+k] + stats
-        stats_list.append(stats)
-        progess_bar.next()
-    progess_bar.finish()
-
-    print('Writing files...')
-    col0 = fits.Column(name='Class', format='20A', array=np.hstack(source_class_list))
-    col1 = fits.Column(name='ID', format='E', array=np.hstack(id_list))
-    col2 = fits.Column(name='time', format='D', array=np.hstack(times_list))
-    col3 = fits.Column(name='mag', format='E', array=np.hstack(mag_list))
-    col4 = fits.Column(name='magerr', format='E', array=np.hstack(magerr_list))
-    cols = fits.ColDefs([col0, col1, col2, col3, col4])
-    hdu = fits.BinTableHDU.from_columns(cols)
-    hdu.writeto('lightcurves.fits',overwrite=True)
 
-    np.savetxt('feats.txt',np.array(stats_list).astype(str),fmt='%s')
-    with open(r'feats.txt', 'r') as infile, open(r'all_features.txt', 'w') as outfile:      
-         data = infile.read()
-         data = data.replace("'", "")
-         data = data.replace(",", "")
-         data = data.replace("[", "")
-         data = data.replace("]", "")
-         outfile.write(data)
-    os.remove('feats.txt')
+        quality = quality_check.test_microlensing(time, mag, magerr, baseline, u_0, t_0, t_e, blend_ratio, n=n)
+        if quality is True:
+            return _with_features(time, mag, magerr)
 
-    coeffs = np.loadtxt('all_features.txt', dtype=str)
-    pca = decomposition.PCA(n_components=82, whiten=True, svd_solver='auto')
-    pca.fit(coeffs[:,np.arange(2,84)].astype(float))
-    X_pca = pca.transform(coeffs[:,np.arange(2,84)].astype(float))
+    raise RuntimeError('Unable to simulate proper ML in 100 tries with current cadence -- inspect cadence and/or noise model and try again.')
 
-    classes = ["VARIABLE"]*n_class+['CONSTANT']*n_class+["CV"]*n_class+["ML"]*n_class+["LPV"]*len(np.where(coeffs[:,0] == 'LPV')[0])
-    np.savetxt('pca_features.txt',np.c_[classes,np.arange(1,len(classes)+1),X_pca[:,:82]],fmt='%s')
+def _simulate_lpv(time, baseline, noise, zp, seed, primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp):
+    """Simulates a single LPV and computes its features.
+    Returns None if the noise model fails, in which case the LPV is skipped.
+    """
+    rng = np.random.default_rng(seed)
+    mag = simulate.simulate_mira_lightcurve(time, baseline, primary_period, amplitude_pp, secondary_period, amplitude_sp, tertiary_period, amplitude_tp, rng=rng)
 
-    if test == True:
-        quality_check.test_classifier('all_features.txt', 'pca_features.txt')
+    try:
+        mag, magerr = _add_noise(mag, noise, zp, rng)
+    except ValueError:
+        return None
 
+    return _with_features(time, mag, magerr)
@@ -16,7 +16,7 @@ setup(
 	url = "https://github.com/dgodinez77/LIA",
 	packages = find_packages('.'),
 	include_package_data=True,
-	install_requires = ['numpy','sklearn','astropy','mpmath','scipy','PeakUtils', 'progress'],
+	install_requires = ['numpy','sklearn','astropy','mpmath','scipy','PeakUtils', 'tqdm', 'joblib>=1.3'],
 	test_suite="nose.collector",
 	package_data={
     '': ['Miras_vo.xml'],